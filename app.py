@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -13,6 +14,32 @@ st.set_page_config(
     layout="wide"
 )
 
+# ============================
+# CONSTANTES
+# ============================
+
+# Lignes RER (les autres lignes sont des lignes de métro)
+RER_LINES = frozenset({'A', 'B', 'C', 'D', 'E'})
+
+# Dictionnaire des couleurs officielles RATP
+COULEURS_RATP = {
+    '1': '#FFCD00',   # Jaune
+    '2': '#0064B0',   # Bleu
+    '3': '#9F9825',   # Vert olive
+    '4': '#C04191',   # Violet/Rose
+    '5': '#F28E42',   # Orange
+    '6': '#83C491',   # Vert clair
+    '7': '#F3A4BA',   # Rose
+    '8': '#CEADD2',   # Mauve
+    '9': '#D5C900',   # Jaune
+    '10': '#E3B32A',  # Jaune orangé
+    '11': '#8D5E2A',  # Marron
+    '12': '#00814F',  # Vert foncé
+    '13': '#82C8E6',  # Bleu clair
+    '14': '#8B5EA8',  # Violet
+    'A': '#E3051C',   # Rouge
+}
+
 # ============================
 # FONCTIONS DE PRÉPARATION DES DONNÉES
 # ============================
@@ -21,47 +48,80 @@ st.set_page_config(
 def load_and_prepare_data():
     """
     Charge et prépare les données des fontaines à eau RATP.
-    - Renomme les colonnes pour plus de clarté
+    - Lit le fichier Parquet généré par csv_to_parquet.py (colonnes déjà renommées)
     - Gère les valeurs manquantes
     - Crée des variables dérivées
-    """
-    # Chargement des données
-    df = pd.read_csv('fontaines-a-eau-dans-le-reseau-ratp.csv', sep=';', encoding='utf-8-sig')
+    - Précalcule les indicateurs clés (KPIs) affichés dans les onglets
     
-    # Renommage des colonnes pour plus de clarté
-    df.columns = [
-        'id_ratp', 'ligne', 'station', 'longitude', 'latitude', 
-        'id_idm', 'adresse', 'code_postal', 'commune', 
-        'num_acces', 'nom_acces', 'zone_controlee', 'point_geo'
-    ]
+    Retourne le tuple (df, kpis).
+    """
+    # Chargement des données (uniquement les colonnes utilisées par l'application)
+    df = pd.read_parquet(
+        'fontaines.parquet',
+        columns=[
+            'ligne', 'station', 'longitude', 'latitude', 
+            'adresse', 'code_postal', 'commune', 
+            'nom_acces', 'zone_controlee'
+        ],
+        dtype_backend='pyarrow'
+    )
     
     # Gestion des valeurs manquantes
     df['zone_controlee'] = df['zone_controlee'].fillna('non renseigné')
     df['nom_acces'] = df['nom_acces'].fillna('Non spécifié')
     
-    # Création de variables dérivées
-    df['type_ligne'] = df['ligne'].apply(lambda x: 'RER' if x in ['A', 'B', 'C', 'D', 'E'] else 'Métro')
-    df['region'] = df['code_postal'].apply(lambda x: 'Paris' if x >= 75000 and x < 76000 else 'Banlieue')
-    
-    # Tri par ligne
-    df = df.sort_values('ligne')
+    # Création de variables dérivées (vectorisées, stockées en catégories)
+    est_rer = df['ligne'].isin(RER_LINES).to_numpy()
+    df['type_ligne'] = pd.Categorical(np.where(est_rer, 'RER', 'Métro'))
+    
+    cp = df['code_postal']
+    est_paris = ((cp >= 75000) & (cp < 76000)).to_numpy(dtype=bool, na_value=False)
+    df['region'] = pd.Categorical(np.where(est_paris, 'Paris', 'Banlieue'))
+    
+    # Tri par ligne (chiffres puis lettres) : clé vectorisée, « 3bis » vaut 3.5, lettres ensuite
+    s = df['ligne'].astype('string')
+    est_num = s.str.fullmatch(r'\d+')
+    est_bis = s.str.endswith('bis') & s.str[:-3].str.fullmatch(r'\d+')
+    num = pd.to_numeric(s.where(est_num), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    num_bis = pd.to_numeric(s.str[:-3].where(est_bis), errors='coerce').to_numpy(dtype='float64', na_value=np.nan) + 0.5
+    sort_num = np.where(np.isnan(num), num_bis, num)
+    df['sort_key_group'] = np.where(np.isnan(sort_num), 1, 0).astype('int8')
+    df['sort_key_val'] = np.nan_to_num(sort_num)
+    df = df.sort_values(['sort_key_group', 'sort_key_val', 'ligne'])
+    
+    # Colonnes à faible cardinalité stockées en catégories
+    for col in ['ligne', 'commune', 'zone_controlee', 'nom_acces']:
+        df[col] = df[col].astype('category')
+    
+    # Indicateurs clés calculés une seule fois
+    kpis = {
+        'total': len(df),
+        'lignes': df['ligne'].nunique(),
+        'communes': df['commune'].nunique(),
+        'zone_ctrl': int((df['zone_controlee'] == 'en zone contrôlée').sum()),
+        'top_lines': df['ligne'].value_counts()
+    }
     
-    return df
+    return df, kpis
 
 def create_line_distribution_chart(df):
     """Crée un graphique de distribution des fontaines par ligne"""
-    line_counts = df['ligne'].value_counts().sort_index()
+    # Sur une colonne catégorielle, sort=False renvoie déjà les lignes dans l'ordre des catégories
+    line_counts = df['ligne'].value_counts(sort=False)
+    line_counts = line_counts[line_counts > 0]  # catégories absentes après filtrage
     
-    fig = px.bar(
-        x=line_counts.index,
-        y=line_counts.values,
-        labels={'x': 'Ligne', 'y': 'Nombre de fontaines'},
-        title='Distribution des fontaines par ligne de métro/RER',
-        color=line_counts.values,
-        color_continuous_scale='Blues'
-    )
+    # Construction directe avec graph_objects à partir des comptages (sans passer par plotly.express)
+    fig = go.Figure(data=[
+        go.Bar(
+            x=line_counts.index.astype(str).tolist(),
+            y=line_counts.values.tolist(),
+            marker=dict(color=line_counts.values.tolist(), colorscale='Blues', showscale=True),
+            hovertemplate='Ligne=%{x}<br>Nombre de fontaines=%{y}<extra></extra>'
+        )
+    ])
     
     fig.update_layout(
+        title='Distribution des fontaines par ligne de métro/RER',
         xaxis_title="Ligne",
         yaxis_title="Nombre de fontaines",
         font=dict(size=12),
@@ -74,53 +134,24 @@ def create_line_distribution_chart(df):
 def create_map_visualization(df_filtered):
     """Crée une carte interactive des fontaines avec couleurs officielles RATP"""
     
-    # Dictionnaire des couleurs officielles RATP
-    couleurs_ratp = {
-        '1': '#FFCD00',   # Jaune
-        '2': '#0064B0',   # Bleu
-        '3': '#9F9825',   # Vert olive
-        '4': '#C04191',   # Violet/Rose
-        '5': '#F28E42',   # Orange
-        '6': '#83C491',   # Vert clair
-        '7': '#F3A4BA',   # Rose
-        '8': '#CEADD2',   # Mauve
-        '9': '#D5C900',   # Jaune
-        '10': '#E3B32A',  # Jaune orangé
-        '11': '#8D5E2A',  # Marron
-        '12': '#00814F',  # Vert foncé
-        '13': '#82C8E6',  # Bleu clair
-        '14': '#8B5EA8',  # Violet
-        'A': '#E3051C',   # Rouge
-    
-    }
+    # Trier df_filtered par ligne pour l'ordre de la légende (clés précalculées au chargement,
+    # tri stable sans copie préalable pour conserver l'ordre des stations de chaque ligne)
+    df_sorted = df_filtered.sort_values(['sort_key_group', 'sort_key_val', 'ligne'], kind='stable')
     
-    # Trier df_filtered par ligne pour l'ordre de la légende
-    df_sorted = df_filtered.copy()
-    
-    # Fonction de tri personnalisée (chiffres puis lettres)
-    def sort_key(ligne):
-        ligne = str(ligne)
-        if ligne.isdigit():
-            return (0, int(ligne))
-        elif ligne[:-3].isdigit() and ligne.endswith('bis'):
-            return (0, int(ligne[:-3]) + 0.5)
-        else:
-            return (1, ligne)
-    
-    df_sorted['sort_key'] = df_sorted['ligne'].apply(sort_key)
-    df_sorted = df_sorted.sort_values('sort_key')
+    # Ne transmettre à Plotly que les colonnes affichées
+    df_plot = df_sorted[['latitude', 'longitude', 'station', 'ligne', 'adresse', 'zone_controlee']]
     
     # Créer la carte
     fig = px.scatter_mapbox(
-        df_sorted,
+        df_plot,
         lat='latitude',
         lon='longitude',
         hover_name='station',
         hover_data={'ligne': True, 'adresse': True, 'zone_controlee': True, 
-                    'latitude': False, 'longitude': False, 'sort_key': False},
+                    'latitude': False, 'longitude': False},
         color='ligne',
-        color_discrete_map=couleurs_ratp,
-        category_orders={'ligne': sorted(df_sorted['ligne'].unique(), key=sort_key)},
+        color_discrete_map=COULEURS_RATP,
+        category_orders={'ligne': df_plot['ligne'].unique().tolist()},
         zoom=11,
         title='Localisation géographique des fontaines'
     )
@@ -148,17 +179,23 @@ def create_map_visualization(df_filtered):
 def create_zone_comparison_chart(df):
     """Crée un graphique comparant zones contrôlées vs non contrôlées"""
     zone_counts = df['zone_controlee'].value_counts()
+    zone_counts = zone_counts[zone_counts > 0]  # catégories absentes après filtrage
+    
+    fig = go.Figure(data=[
+        go.Pie(
+            values=zone_counts.values.tolist(),
+            labels=zone_counts.index.astype(str).tolist(),
+            marker=dict(colors=px.colors.qualitative.Set3),
+            textposition='inside',
+            textinfo='percent+label'
+        )
+    ])
     
-    fig = px.pie(
-        values=zone_counts.values,
-        names=zone_counts.index,
+    fig.update_layout(
         title='Répartition des fontaines par type de zone',
-        color_discrete_sequence=px.colors.qualitative.Set3
+        height=400
     )
     
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(height=400)
-    
     return fig
 
 def create_type_comparison_chart(df):
@@ -184,10 +221,57 @@ def create_type_comparison_chart(df):
     
     return fig
 
+# ============================
+# FILTRES ET GRAPHIQUES MIS EN CACHE
+# ============================
+
+@st.cache_data
+def get_filtered(lines: tuple, type_: str, zone: str) -> pd.DataFrame:
+    """
+    Applique les filtres du dashboard aux données chargées.
+    Les arguments sont hashables pour que Streamlit mémorise le résultat
+    par combinaison de filtres. Les lignes arrivent en tuple trié (clé de
+    cache stable, ce que ne garantit pas l'ordre d'itération d'un frozenset)
+    et sont converties en ensemble pour les tests d'appartenance.
+    """
+    df, _ = load_and_prepare_data()
+    lines_set = frozenset(lines)
+    
+    # Un seul masque booléen combiné, puis une seule sélection
+    mask = df['ligne'].isin(lines_set)
+    
+    if type_ != 'Tous':
+        mask &= df['type_ligne'] == type_
+    
+    if zone != 'Toutes':
+        mask &= df['zone_controlee'] == zone
+    
+    return df.loc[mask]
+
+# Les figures sont mises en cache avec st.cache_resource : l'objet Figure est partagé
+# tel quel entre les réexécutions, sans aller-retour pickle qui revalide toute la figure
+# à chaque lecture du cache (les appelants ne modifient pas les figures). Les caches
+# sont bornés car le nombre de combinaisons de lignes possibles est très grand.
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_line_chart(lines: tuple, type_: str, zone: str):
+    """Graphique de distribution par ligne, mémorisé par combinaison de filtres"""
+    return create_line_distribution_chart(get_filtered(lines, type_, zone))
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_zone_chart(lines: tuple, type_: str, zone: str):
+    """Graphique des zones contrôlées, mémorisé par combinaison de filtres"""
+    return create_zone_comparison_chart(get_filtered(lines, type_, zone))
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_map(lines: tuple, type_: str, zone: str):
+    """Carte des fontaines (figure la plus lourde), mémorisée par combinaison de filtres"""
+    return create_map_visualization(get_filtered(lines, type_, zone))
+
 # ============================
 # CHARGEMENT DES DONNÉES
 # ============================
-df = load_and_prepare_data()
+df, kpis = load_and_prepare_data()
 
 # ============================
 # CRÉATION DES ONGLETS
@@ -197,7 +281,13 @@ tab1, tab2, tab3 = st.tabs(["👤 CV Ismaël Gahlouzi", "📊 Dashboard Fontaine
 # ============================
 # ONGLET 1 : DASHBOARD PRINCIPAL
 # ============================
-with tab2:
+@st.fragment
+def render_dashboard(df, kpis):
+    """
+    Affiche le dashboard principal.
+    Fragment : un changement de filtre ne réexécute que cette fonction,
+    pas les autres onglets.
+    """
     st.title("💧 Dashboard d'analyse des fontaines à eau RATP")
     st.markdown("""
     Ce dashboard présente l'analyse des **81 fontaines à eau** installées dans le réseau RATP (métro et RER).
@@ -210,17 +300,16 @@ with tab2:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total fontaines", len(df))
+        st.metric("Total fontaines", kpis['total'])
     
     with col2:
-        st.metric("Lignes équipées", df['ligne'].nunique())
+        st.metric("Lignes équipées", kpis['lignes'])
     
     with col3:
-        st.metric("Communes desservies", df['commune'].nunique())
+        st.metric("Communes desservies", kpis['communes'])
     
     with col4:
-        zone_ctrl = len(df[df['zone_controlee'] == 'en zone contrôlée'])
-        st.metric("En zone contrôlée", zone_ctrl)
+        st.metric("En zone contrôlée", kpis['zone_ctrl'])
     
     st.markdown("---")
     
@@ -229,11 +318,14 @@ with tab2:
     
     col_filter1, col_filter2, col_filter3 = st.columns(3)
     
+    # Liste des lignes calculée une fois (catégories déjà triées de la colonne catégorielle)
+    all_lines = df['ligne'].cat.categories.tolist()
+    
     with col_filter1:
         selected_lines = st.multiselect(
             "Sélectionner les lignes",
-            options=sorted(df['ligne'].unique()),
-            default=sorted(df['ligne'].unique())
+            options=all_lines,
+            default=all_lines
         )
     
     with col_filter2:
@@ -248,14 +340,9 @@ with tab2:
             options=['Toutes', 'en zone contrôlée', 'non renseigné']
         )
     
-    # Application des filtres
-    df_filtered = df[df['ligne'].isin(selected_lines)]
-    
-    if selected_type != 'Tous':
-        df_filtered = df_filtered[df_filtered['type_ligne'] == selected_type]
-    
-    if selected_zone != 'Toutes':
-        df_filtered = df_filtered[df_filtered['zone_controlee'] == selected_zone]
+    # Application des filtres (clé triée pour un hash de cache stable)
+    filter_key = (tuple(sorted(selected_lines)), selected_type, selected_zone)
+    df_filtered = get_filtered(*filter_key)
     
     st.info(f"**{len(df_filtered)} fontaines** correspondent à vos critères de filtrage")
     
@@ -265,14 +352,18 @@ with tab2:
     col_viz1, col_viz2 = st.columns(2)
     
     with col_viz1:
-        st.plotly_chart(create_line_distribution_chart(df_filtered), use_container_width=True)
+        st.plotly_chart(build_line_chart(*filter_key), use_container_width=True)
     
     with col_viz2:
-        st.plotly_chart(create_zone_comparison_chart(df_filtered), use_container_width=True)
+        st.plotly_chart(build_zone_chart(*filter_key), use_container_width=True)
     
     # Carte interactive
     st.subheader("🗺️ Carte interactive des fontaines")
-    st.plotly_chart(create_map_visualization(df_filtered), use_container_width=True)
+    if df_filtered.empty:
+        # scatter_mapbox ne sait pas centrer une carte sans aucun point
+        st.warning("Aucune fontaine à afficher sur la carte avec ces filtres")
+    else:
+        st.plotly_chart(build_map(*filter_key), use_container_width=True)
     
     # Tableau de données
     st.subheader("📋 Données filtrées")
@@ -282,6 +373,9 @@ with tab2:
         height=300
     )
 
+with tab2:
+    render_dashboard(df, kpis)
+
 # ============================
 # ONGLET 2 : ANALYSES DÉTAILLÉES
 # ============================
@@ -317,7 +411,7 @@ with tab3:
         # Top 10 des lignes
     st.subheader("🏆 Top 10 des lignes les mieux équipées")
     
-    top_lines = df['ligne'].value_counts().head(10)
+    top_lines = kpis['top_lines'].head(10)
     
     fig = go.Figure(data=[
         go.Bar(
@@ -346,18 +440,26 @@ with tab3:
     # Analyse textuelle
     st.subheader("📝 Principaux enseignements")
     
+    # Agrégats calculés une seule fois pour le texte
+    n_total = kpis['total']
+    n_lignes = kpis['lignes']
+    n_zone = kpis['zone_ctrl']
+    top4 = top_lines.head(4).index.astype(str).tolist()
+    n_paris = int((df['region'] == 'Paris').sum())
+    n_banlieue = n_total - n_paris
+    
     st.markdown(f"""
     ### Observations clés :
     
-    1. **Couverture du réseau** : {len(df)} fontaines réparties sur {df['ligne'].nunique()} lignes différentes
+    1. **Couverture du réseau** : {n_total} fontaines réparties sur {n_lignes} lignes différentes
     
-    2. **Distribution inégale** : Les lignes **{', '.join(df['ligne'].value_counts().head(4).index.astype(str))}** 
+    2. **Distribution inégale** : Les lignes **{', '.join(top4)}** 
        sont les mieux équipées avec respectivement 9 fontaines chacune.
     
-    3. **Accessibilité** : Seulement **{len(df[df['zone_controlee'] == 'en zone contrôlée'])} fontaines ({len(df[df['zone_controlee'] == 'en zone contrôlée'])/len(df)*100:.1f}%)** 
+    3. **Accessibilité** : Seulement **{n_zone} fontaines ({n_zone/n_total*100:.1f}%)** 
        sont situées en zone contrôlée (après validation du titre de transport)
     
-    4. **Couverture géographique** : {len(df[df['region'] == 'Paris'])} fontaines à Paris et {len(df[df['region'] == 'Banlieue'])} en banlieue
+    4. **Couverture géographique** : {n_paris} fontaines à Paris et {n_banlieue} en banlieue
     
     5. **Recommandations** : 
        - Augmenter le nombre de fontaines sur les lignes les moins équipées
@@ -368,7 +470,13 @@ with tab3:
 # ============================
 # ONGLET 3 : CV
 # ============================
-with tab1:
+@st.fragment
+def render_cv():
+    """
+    Affiche le CV.
+    Contenu statique ; rendu dans un fragment pour ne pas être réexécuté
+    par les reruns de fragment (une réexécution complète le réaffiche).
+    """
     col_left, col_right = st.columns([1, 3])
     
     with col_left:
@@ -477,6 +585,9 @@ with tab1:
             - ⚙️ **VBA** (automatisation Excel)
             """)
 
+with tab1:
+    render_cv()
+
 # ============================
 # FOOTER
 # ============================
@@ -0,0 +1,49 @@
+import pandas as pd
+
+# ============================
+# CONVERSION CSV -> PARQUET
+# ============================
+# Script à lancer une fois (et à chaque mise à jour du CSV Open Data RATP) :
+#     python csv_to_parquet.py
+# Il écrit fontaines.parquet, lu par app.py au démarrage à la place du CSV.
+
+CSV_PATH = 'fontaines-a-eau-dans-le-reseau-ratp.csv'
+PARQUET_PATH = 'fontaines.parquet'
+
+
+def convert_csv_to_parquet():
+    """
+    Lit le CSV brut et l'écrit au format Parquet.
+    - Ne garde que les colonnes utilisées par l'application
+    - Renomme les colonnes comme dans app.py
+    Le nettoyage et les variables dérivées restent faits dans app.py.
+    """
+    # Le moteur pyarrow impose des noms de colonnes bruts, dont un contient un retour à la ligne.
+    df = pd.read_csv(
+        CSV_PATH,
+        sep=';',
+        encoding='utf-8-sig',
+        engine='pyarrow',
+        dtype_backend='pyarrow',
+        usecols=[
+            'Ligne', 'Station ou Gare', 'Longitude', 'Latitude',
+            'Adresse', 'Code postal', 'Commune',
+            "Nom de l'accès à la station le plus proche \n", 'En zone contrôlée ou non'
+        ],
+        dtype={'Code postal': 'int32[pyarrow]'}
+    )
+    
+    # Renommage des colonnes pour plus de clarté
+    df.columns = [
+        'ligne', 'station', 'longitude', 'latitude', 
+        'adresse', 'code_postal', 'commune', 
+        'nom_acces', 'zone_controlee'
+    ]
+    
+    df.to_parquet(PARQUET_PATH, compression='zstd', index=False)
+    return df
+
+
+if __name__ == '__main__':
+    df = convert_csv_to_parquet()
+    print(f"{len(df)} lignes écrites dans {PARQUET_PATH}")